@@ -17,6 +17,7 @@ setup(
     install_requires=[
         "dustgoggles",
         "google-api-python-client",
+        "google-auth-httplib2",
         "oauth2client",
         "pandas",
         "pip",
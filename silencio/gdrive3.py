@@ -1,37 +1,110 @@
+from concurrent.futures import ThreadPoolExecutor
 from csv import DictReader
-from functools import cache, partial
-from io import BytesIO
+from functools import lru_cache, partial
+from io import BytesIO, TextIOWrapper
+from itertools import chain, islice
 import json
-from operator import attrgetter
+import mimetypes
 from pathlib import Path
+import random
 import re
-from typing import Callable, Iterator, Optional, Sequence, Union
+import shutil
+import subprocess
+import threading
+import time
+from typing import Callable, Iterable, Iterator, Optional, Sequence, Union
 
-from cytoolz import first, keyfilter
 from dustgoggles.pivot import split_on
+from google_auth_httplib2 import AuthorizedHttp
 import googleapiclient.discovery as discovery
-from googleapiclient.errors import BatchError
-from googleapiclient.http import MediaInMemoryUpload, MediaFileUpload
+from googleapiclient.errors import BatchError, HttpError
+from googleapiclient.http import (
+    build_http, MediaInMemoryUpload, MediaFileUpload
+)
 from oauth2client.client import AssertionCredentials
 import pandas as pd
-import sh
 
 from silencio.treeutils import (
     add_files_to_segmented_trees,
     flip_path_tree,
+    is_descendant,
     make_drive_adjacency_list,
     segment_trees,
 )
 
 
-MIMETYPE = re.compile(r"\s+(\w+/\w+)\n")
+MAGIC_NUMBERS = (
+    (b"\x89PNG", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"%PDF", "application/pdf"),
+    (b"PK\x03\x04", "application/zip"),
+)
+FILE_COMMAND = shutil.which("file")
+
+
+@lru_cache(maxsize=4096)
+def _suffix_mimetype(suffix: str) -> Optional[str]:
+    return mimetypes.guess_type(f"file{suffix}")[0]
+
+
+def sniff_mimetype(path: Union[str, Path]) -> str:
+    with open(path, "rb") as stream:
+        head = stream.read(512)
+    for magic, mimetype in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return mimetype
+    if FILE_COMMAND is None:
+        return "application/octet-stream"
+    # last resort; this costs a subprocess
+    result = subprocess.run(
+        [FILE_COMMAND, "-b", "--mime-type", str(path)],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0 or "/" not in result.stdout:
+        return "application/octet-stream"
+    return result.stdout.strip()
 
 
 def infer_mimetype(path: Union[str, Path]) -> str:
+    mimetype = _suffix_mimetype(Path(path).suffix)
+    if mimetype is None:
+        return sniff_mimetype(path)
+    return mimetype
+
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def execute_with_backoff(execute: Callable, max_retries: int = 5):
+    """
+    call `execute`, retrying on rate-limit and server errors. waits as long
+    as the server's Retry-After header asks, if it sends one; otherwise
+    backs off exponentially (plus jitter).
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return execute()
+        except HttpError as error:
+            if (
+                error.resp.status not in RETRY_STATUSES
+                or attempt == max_retries
+            ):
+                raise
+            try:
+                delay = float(error.resp.get("retry-after"))
+            except (TypeError, ValueError):
+                delay = 2 ** attempt * 0.1 + random.uniform(0, 0.1)
+            time.sleep(delay)
+
+
+def request_record(request) -> dict:
+    """describe a request for an error record."""
     try:
-        return re.search(MIMETYPE, sh.file(str(path), mime_type=True)).group(1)
-    except AttributeError:
-        return "application/octet-stream"
+        return json.loads(request.to_json())
+    except (TypeError, ValueError):
+        # e.g. media uploads, whose bodies may not be JSON-serializable
+        return {'method': request.method, 'uri': request.uri}
 
 
 class ExecutionError(Exception):
@@ -47,6 +120,7 @@ class DriveResource(discovery.Resource):
 
 class DriveBot:
     def __init__(self, creds: AssertionCredentials, shared_drive_id=None):
+        self.creds = creds
         self.resource: DriveResource = discovery.build(
             "drive", "v3", credentials=creds
         )
@@ -54,6 +128,7 @@ class DriveBot:
         self.files = self.resource.files
         self.new_batch_http_request = self.resource.new_batch_http_request
         self.filesystem = {}
+        self.fs_index = {}
         self.collisions = {}
         self.root_id = ""
         self.batches = []
@@ -65,12 +140,19 @@ class DriveBot:
         self.errors = []
         self.scanner = DriveScanner(self)
         self.temp_filesystem = {}
+        self._thread_local = threading.local()
+        self._ls_cache = {}
+        self.start_page_token = None
 
     def scan(self, force=False, verbose=True):
         if (self.scanner.complete is True) and (force is False):
             return
         if force is True:
             self.scanner = DriveScanner(self)
+        # fetched before scanning so that changes made mid-scan are not lost
+        self.start_page_token = self.resource.changes().getStartPageToken(
+            **self._changes_parameters()
+        ).execute()["startPageToken"]
         self.scanner.get(verbose)
 
     def set_filesystem(self, root_id=None):
@@ -81,24 +163,140 @@ class DriveBot:
             self.collisions,
             self.root_id,
         ) = self.scanner.extract_filesystem(root_id)
+        self.fs_index = index_fs_dict(self.filesystem)
+
+    def save_state(self, path: Union[str, Path]):
+        """
+        write the filesystem and the Drive changes token to a JSON file, so
+        that a later DriveBot can load_state() instead of rescanning.
+        """
+        state = {
+            "filesystem": self.filesystem,
+            "collisions": {
+                name: sorted(ids) for name, ids in self.collisions.items()
+            },
+            "root_id": self.root_id,
+            "start_page_token": self.start_page_token,
+        }
+        with open(path, "w") as stream:
+            json.dump(state, stream)
+
+    def load_state(self, path: Union[str, Path], update: bool = True):
+        """
+        load a filesystem written by save_state(). if update is True, also
+        apply any changes made in Drive since it was saved.
+        """
+        with open(path) as stream:
+            state = json.load(stream)
+        self.filesystem = state["filesystem"]
+        self.collisions = {
+            name: set(ids) for name, ids in state["collisions"].items()
+        }
+        self.root_id = state["root_id"]
+        self.start_page_token = state["start_page_token"]
+        self.fs_index = index_fs_dict(self.filesystem)
+        if update is True and self.start_page_token is not None:
+            self.update_filesystem()
+
+    def update_filesystem(self):
+        """
+        apply changes made in Drive since self.start_page_token to
+        self.filesystem. collisions are not recomputed.
+        """
+        parameters = {
+            "fields": (
+                "nextPageToken, newStartPageToken, "
+                "changes(changeType, fileId, removed, "
+                "file(name, parents, mimeType, trashed))"
+            ),
+            "pageSize": 1000,
+            **self._changes_parameters(),
+        }
+        if self.shared_drive_id is not None:
+            parameters["includeItemsFromAllDrives"] = True
+        changes, page_token = {}, self.start_page_token
+        while page_token is not None:
+            response = self.resource.changes().list(
+                pageToken=page_token, **parameters
+            ).execute()
+            for change in response.get("changes", []):
+                # shared drive changes have no fileId
+                if change.get("changeType", "file") != "file":
+                    continue
+                changes[change["fileId"]] = change
+            page_token = response.get("nextPageToken")
+            if "newStartPageToken" in response:
+                self.start_page_token = response["newStartPageToken"]
+        self.filesystem = self._apply_changes(changes)
+        self.fs_index = index_fs_dict(self.filesystem)
+        self.invalidate()
+
+    def _apply_changes(self, changes):
+        """
+        changes.list orders files by their latest change, so a file can
+        arrive before the folder it lives in. gather every change first,
+        then resolve paths until nothing new resolves.
+        """
+        nodes = {}
+        for path, drive_id in self.filesystem.items():
+            parent, _, name = path.rpartition("/")
+            parent_id = self.filesystem.get(parent) if parent else self.root_id
+            nodes[drive_id] = ([parent_id], name)
+        for drive_id, change in changes.items():
+            file = change.get("file")
+            if change.get("removed") or file is None or file.get("trashed"):
+                nodes.pop(drive_id, None)
+            else:
+                nodes[drive_id] = (file.get("parents", []), file["name"])
+        paths = {}
+        while nodes:
+            unresolved = {}
+            for drive_id, (parents, name) in nodes.items():
+                if self.root_id in parents:
+                    paths[drive_id] = name
+                    continue
+                parent_path = next(
+                    (paths[p] for p in parents if p in paths), None
+                )
+                if parent_path is None:
+                    unresolved[drive_id] = (parents, name)
+                else:
+                    paths[drive_id] = f"{parent_path}/{name}"
+            # anything left is outside the tree we're tracking
+            if len(unresolved) == len(nodes):
+                break
+            nodes = unresolved
+        return {
+            path: drive_id
+            for drive_id, path in sorted(paths.items(), key=lambda x: x[1])
+        }
+
+    def _changes_parameters(self):
+        if self.shared_drive_id is None:
+            return {}
+        return {"supportsAllDrives": True, "driveId": self.shared_drive_id}
 
     def mkdir(self, name, parent_name=None, parent_id=None, defer=False):
+        parent_id = self._pick_id(parent_name, parent_id)
         request = self.files().create(
             body={
                 "name": name,
-                "parents": [self._pick_id(parent_name, parent_id)],
+                "parents": [parent_id],
                 "mimeType": "application/vnd.google-apps.folder",
             },
             **self.extra_parameters,
             fields="id"
         )
         if defer is False:
-            return request.execute()
+            response = request.execute()
+            if parent_id in self._ls_cache.keys():
+                self._ls_cache[parent_id][name] = response['id']
+            return response
         return request
 
-    @cache
     def cd(self, parent_id, name, mkdir=True):
-        existing = self.ls(folder_id=parent_id)
+        if (existing := self._ls_cache.get(parent_id)) is None:
+            existing = self._ls_cache[parent_id] = self.ls(folder_id=parent_id)
         # TODO: check if this is actually a folder
         if name in existing.keys():
             return existing[name]
@@ -108,6 +306,16 @@ class DriveBot:
             f"{name} does not exist in {parent_id} & mkdir is False"
         )
 
+    def invalidate(self, parent_id=None):
+        """
+        forget cached folder contents used by cd(), for one folder or (if
+        parent_id is None) all of them.
+        """
+        if parent_id is None:
+            self._ls_cache = {}
+        else:
+            self._ls_cache.pop(parent_id, None)
+
     def manifest(self, folder_id, fields=None):
         kwargs = {'query': f"'{folder_id}' in parents and trashed=false"}
         if fields is not None:
@@ -126,18 +334,115 @@ class DriveBot:
             )
             scanner.get()
             return {f['name']: f['id'] for f in scanner.results}
-        return ls_fs_dict(folder_name, self.filesystem)
+        return ls_fs_dict(folder_name, self.fs_index)
 
-    def find(self, folder_name=None, folder_id=None, regex=None):
-        raise NotImplementedError
+    def ls_many(
+        self,
+        folder_ids: Sequence[str],
+        fields: Sequence[str] = (
+            "id", "name", "mimeType", "parents", "md5Checksum"
+        ),
+    ) -> dict[str, list[dict]]:
+        """
+        list the contents of many folders at once. the first page of every
+        folder's listing is fetched in batched requests; only folders with
+        more than one page of contents need further round trips.
+        """
+        scanners = {
+            folder_id: DriveScanner(
+                self, f"'{folder_id}' in parents and trashed=false", fields
+            )
+            for folder_id in dict.fromkeys(folder_ids)
+        }
+        responses = self._execute_as_batches(
+            {
+                folder_id: self.files().list(**scanner.compose_request())
+                for folder_id, scanner in scanners.items()
+            }
+        )
+        for folder_id, response in responses.items():
+            scanners[folder_id].ingest(response)
+        for scanner in scanners.values():
+            scanner.get()
+        return {
+            folder_id: scanner.results
+            for folder_id, scanner in scanners.items()
+        }
+
+    def find(
+        self,
+        folder_name=None,
+        folder_id=None,
+        regex: Optional[Union[str, re.Pattern]] = None,
+        contains=None,
+        recursive=True,
+        limit: Optional[int] = None,
+    ):
+        """
+        search for files by name. `contains` is passed to Drive as a
+        server-side 'name contains' filter; `regex` (a string or compiled
+        pattern) is searched for in the names of the returned files. if a
+        folder is specified, returns only files beneath that folder (or only
+        its direct children if `recursive` is False). otherwise searches the
+        whole Drive. if `limit` is given, stops fetching pages as soon as
+        that many matches have been found.
+        """
+        query = "trashed=false"
+        if contains is not None:
+            contains = contains.replace("\\", "\\\\").replace("'", "\\'")
+            query += f" and name contains '{contains}'"
+        if (folder_name is not None) or (folder_id is not None):
+            folder_id = self._pick_id(folder_name, folder_id)
+            if recursive is False:
+                query += f" and '{folder_id}' in parents"
+        scanner = DriveScanner(
+            self, query, fields=("id", "name", "mimeType", "parents")
+        )
+        matches = scanner.iter_files()
+        if regex is not None:
+            pattern = re.compile(regex)
+            matches = (f for f in matches if pattern.search(f["name"]))
+        if (folder_id is not None) and (recursive is True):
+            # rather than walking down from folder_id one ls at a time, fetch
+            # the parentage of every folder in one paged query and walk up
+            adjacencies = make_drive_adjacency_list(self._folder_manifest())
+            matches = (
+                f for f in matches
+                if any(
+                    is_descendant(adjacencies, parent, folder_id)
+                    for parent in f.get("parents", [])
+                )
+            )
+        return list(islice(matches, limit))
+
+    def _folder_manifest(self):
+        if self.scanner.complete is True:
+            if self.scanner.directories is None:
+                self.scanner.make_manifest()
+            return self.scanner.directories
+        scanner = DriveScanner(
+            self,
+            "mimeType='application/vnd.google-apps.folder' and trashed=false",
+            fields=("id", "name", "mimeType", "parents"),
+        )
+        scanner.get()
+        return scanner.make_manifest()[0]
 
     @staticmethod
-    def _decode_csv(text, to_pandas=True, **pd_kwargs):
-        # inefficient, better to know sep from the outset...but whatever
-        records = list(DictReader(re.split("[\r\n]+", text)))
+    def _decode_csv(raw: bytes, to_pandas=True, **pd_kwargs):
         if to_pandas is True:
-            return pd.DataFrame(records, **pd_kwargs)
-        return records
+            # by default, match the all-strings output of DictReader
+            pd_kwargs = {"dtype": str, "keep_default_na": False} | pd_kwargs
+            try:
+                return pd.read_csv(BytesIO(raw), **pd_kwargs)
+            except pd.errors.EmptyDataError:
+                # e.g. an empty sheet
+                return pd.DataFrame()
+        return list(
+            DictReader(
+                TextIOWrapper(BytesIO(raw), encoding="utf-8", newline="")
+            )
+        )
 
     def _get_csv(
         self,
@@ -152,24 +457,28 @@ class DriveBot:
         request = get_method(fileId=file_id)
         if defer is True:
             return request
-        text = request.execute().decode()
-        return self._decode_csv(text, to_pandas, **pd_kwargs)
+        return self._decode_csv(request.execute(), to_pandas, **pd_kwargs)
 
-    def read_sheet(self, name=None, file_id=None, to_pandas=True):
+    def read_sheet(self, name=None, file_id=None, to_pandas=True, **pd_kwargs):
         """
         returns a google sheet as a dict or DataFrame. does not have all the
         functionality of the Sheets API. reads only the first sheet of a
-        multi-sheet Sheet.
+        multi-sheet Sheet. pd_kwargs are passed to pd.read_csv.
         """
         get_method = partial(self.files().export, mimeType="text/csv")
-        return self._get_csv(get_method, name, file_id, to_pandas)
+        return self._get_csv(
+            get_method, name, file_id, to_pandas, **pd_kwargs
+        )
 
-    def read_csv(self, name=None, file_id=None, to_pandas=True):
+    def read_csv(self, name=None, file_id=None, to_pandas=True, **pd_kwargs):
         """
-        returns a csv file stored in Drive as a dict or DataFrame.
+        returns a csv file stored in Drive as a dict or DataFrame. pd_kwargs
+        are passed to pd.read_csv.
         """
         get_method = self.files().get_media
-        return self._get_csv(get_method, name, file_id, to_pandas)
+        return self._get_csv(
+            get_method, name, file_id, to_pandas, **pd_kwargs
+        )
 
     def read_file(self, file_id, defer=False):
         request = self.files().get_media(fileId=file_id)
@@ -181,6 +490,31 @@ class DriveBot:
         with open(target_file, "wb") as stream:
             stream.write(self.read_file(file_id))
 
+    def get_many(
+        self,
+        items: Sequence[tuple[str, Union[str, Path]]],
+        max_workers: int = 8,
+        raise_errors: bool = True,
+    ):
+        """
+        download many (file_id, target_file) pairs concurrently. Drive does
+        not permit batching media requests, so this uses a thread pool.
+        returns the target path of each successful download, or None for
+        each failed one.
+        """
+        def write(item, content):
+            with open(item[1], "wb") as stream:
+                stream.write(content)
+            return item[1]
+
+        return self._run_concurrently(
+            lambda item: self.read_file(item[0], defer=True),
+            items,
+            max_workers,
+            raise_errors,
+            handle_response=write,
+        )
+
     # TODO: allow updating an existing file by path name
     def df_to_drive_csv(
         self,
@@ -195,11 +529,9 @@ class DriveBot:
         writes a DataFrame to Drive as a csv file.
         """
         name, file_id = self._pick_name_id(name, file_id)
-        buffer = BytesIO()
-        # noinspection PyTypeChecker
-        df.to_csv(buffer, index=False)
-        buffer.seek(0)
-        csv_body = MediaInMemoryUpload(buffer.read(), mimetype="text/csv")
+        csv_body = MediaInMemoryUpload(
+            df.to_csv(index=False).encode("utf-8"), mimetype="text/csv"
+        )
         if name is not None:
             folder_id = self._pick_id(folder_name, folder_id)
             request = self.files().create(
@@ -231,6 +563,30 @@ class DriveBot:
             return request
         return request.execute()
 
+    def put_many(
+        self,
+        sources: Sequence[Union[str, Path]],
+        folder_name: Optional[str] = None,
+        folder_id: Optional[str] = None,
+        mimetype: Optional[str] = None,
+        max_workers: int = 8,
+        raise_errors: bool = True,
+    ):
+        """
+        upload many files to a single folder concurrently. Drive does not
+        permit batching media requests, so this uses a thread pool.
+        """
+        folder_id = self._pick_id(folder_name, folder_id)
+
+        def upload(source):
+            return self.put(
+                source, folder_id=folder_id, mimetype=mimetype, defer=True
+            )
+
+        return self._run_concurrently(
+            upload, sources, max_workers, raise_errors
+        )
+
     def mv(
         self,
         name: Optional[str] = None,
@@ -243,9 +599,10 @@ class DriveBot:
         folder_id = self._pick_id(folder_name, folder_id)
         parameters = {"addParents": folder_id, "fileId": file_id}
         if name is not None:
+            parent = name.rpartition("/")[0]
             try:
-                parameters["removeParents"] = str(
-                    Path(self.filesystem[name]).parent
+                parameters["removeParents"] = (
+                    self.filesystem[parent] if parent != "" else self.root_id
                 )
             except KeyError:
                 pass
@@ -259,6 +616,33 @@ class DriveBot:
             return request
         return request.execute()
 
+    def mv_many(self, items: Sequence[tuple[str, str]]):
+        """
+        move many (file_id, folder_id) pairs. looks up all the files'
+        current parents in one set of batches, then moves them all in
+        another.
+        """
+        parents = self._execute_as_batches(
+            {
+                file_id: self.files().get(
+                    fileId=file_id, fields="parents", **self.extra_parameters
+                )
+                for file_id, _ in items
+            }
+        )
+        responses = self._execute_as_batches(
+            {
+                file_id: self.files().update(
+                    fileId=file_id,
+                    addParents=folder_id,
+                    removeParents=parents[file_id]["parents"][0],
+                    **self.extra_parameters,
+                )
+                for file_id, folder_id in items
+            }
+        )
+        return [responses[file_id] for file_id, _ in items]
+
     def cp(
         self,
         filename: str,
@@ -283,24 +667,20 @@ class DriveBot:
             folder_id,
             ('name', 'id', 'md5Checksum', 'parents', 'mimeType', 'createdTime')
         )
-        if len(manifest) == 0:
+        if len(manifest) == 0 or 'md5Checksum' not in manifest.columns:
             return {}
-        files = manifest['name'].tolist() if files is None else files
-        checksums = {}
-        for f in manifest.to_dict('records'):
-            if (name := f['name']) not in files:
-                continue
-            # if someone has thrown a Google Workspace object in the folder,
-            # it won't have a checksum, and we never, ever care about it
-            # in a situation where we are producing checksums
-            if (checksum := f.get('md5Checksum')) is None:
-                continue
-            checksums[name] = {
-                'id': f['id'],
-                'md5': f.get('md5Checksum'),
-                'created': f['createdTime']
+        # if someone has thrown a Google Workspace object in the folder,
+        # it won't have a checksum, and we never, ever care about it
+        # in a situation where we are producing checksums
+        manifest = manifest.dropna(subset=['md5Checksum'])
+        if files is not None:
+            manifest = manifest.loc[manifest['name'].isin(set(files))]
+        return {
+            f.name: {
+                'id': f.id, 'md5': f.md5Checksum, 'created': f.createdTime
             }
-        return checksums
+            for f in manifest.itertuples(index=False)
+        }
 
     def rm(self, name=None, file_id=None, defer=False):
         file_id = self._pick_id(name, file_id)
@@ -309,6 +689,17 @@ class DriveBot:
             return request
         return request.execute()
 
+    def rm_many(self, file_ids: Sequence[str]):
+        """delete many files by id, in as few batched requests as possible."""
+        self._execute_as_batches(
+            {
+                file_id: self.files().delete(
+                    fileId=file_id, **self.extra_parameters
+                )
+                for file_id in file_ids
+            }
+        )
+
     def add_request(self, request, callback=None, request_id=None):
         if (
             len(self.batches) == 0
@@ -321,11 +712,119 @@ class DriveBot:
             self.batches.append(self.new_batch_http_request())
             self.add_request(request, callback, request_id)
 
-    def execute_batches(self, clear_batches=True, raise_errors=True):
-        # TODO: add an HTTPError catch, not sure which kind
-        execution = tuple(
-            map(lambda x: x(), map(attrgetter("execute"), self.batches))
+    def _thread_http(self):
+        # googleapiclient's Http objects are not thread-safe, so each worker
+        # thread gets its own authorized connection
+        http = getattr(self._thread_local, "http", None)
+        if http is None:
+            if hasattr(self.creds, "authorize"):
+                # oauth2client credentials
+                http = self.creds.authorize(build_http())
+            else:
+                # google-auth credentials
+                http = AuthorizedHttp(self.creds, http=build_http())
+            self._thread_local.http = http
+        return http
+
+    def _record_http_error(self, request, error, batchnum=None):
+        """add an error record shaped like those made by execute_batches."""
+        try:
+            response = json.loads(error.content.decode('utf-8'))
+        except (AttributeError, UnicodeDecodeError, ValueError):
+            response = {}
+        status = getattr(getattr(error, 'resp', None), 'status', None)
+        self.errors.append(
+            {
+                'request': request_record(request),
+                'status': str(status),
+                'response': response,
+                'error': response.get('error', str(error)),
+                'batchnum': batchnum,
+            }
         )
+
+    def _run_concurrently(
+        self,
+        make_request,
+        items,
+        max_workers,
+        raise_errors,
+        handle_response=None,
+    ):
+        """
+        execute make_request(item) for each item in a thread pool, passing
+        responses to handle_response(item, response) if given. failures are
+        recorded in self.errors and leave None in the returned tuple.
+        """
+        def run(item):
+            request = make_request(item)
+            try:
+                response = execute_with_backoff(
+                    partial(request.execute, http=self._thread_http())
+                )
+            except HttpError as error:
+                self._record_http_error(request, error)
+                return None
+            if handle_response is not None:
+                return handle_response(item, response)
+            return response
+
+        n_errors = len(self.errors)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = tuple(pool.map(run, items))
+        if len(self.errors) > n_errors and raise_errors is True:
+            raise ExecutionError("some requests failed. check self.errors.")
+        return results
+
+    def _execute_as_batches(self, requests):
+        """
+        execute a mapping of request_id: request immediately, in as few
+        batches as possible, without touching self.batches. returns a dict
+        of request_id: response.
+        """
+        responses, batchnums, n_errors = {}, {}, len(self.errors)
+
+        def record(request_id, response, exception):
+            if exception is not None:
+                self._record_http_error(
+                    requests[request_id], exception, batchnums[request_id]
+                )
+            else:
+                responses[request_id] = response
+
+        batches = []
+        for request_id, request in requests.items():
+            if len(batches) == 0 or len(batches[-1]._requests) >= 100:
+                batches.append(self.new_batch_http_request(callback=record))
+            batches[-1].add(request, request_id=request_id)
+            batchnums[request_id] = len(batches) - 1
+        self._run_batches(batches)
+        if len(self.errors) > n_errors:
+            raise ExecutionError("some requests failed. check self.errors.")
+        return responses
+
+    def _run_batches(self, batches, max_workers=8):
+        """
+        execute batches concurrently, each worker with its own Http. note
+        that this means batch callbacks may be called from worker threads.
+        """
+        if len(batches) < 2:
+            return tuple(
+                execute_with_backoff(batch.execute) for batch in batches
+            )
+
+        def run(batch):
+            return execute_with_backoff(
+                partial(batch.execute, http=self._thread_http())
+            )
+
+        workers = min(max_workers, len(batches))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return tuple(pool.map(run, batches))
+
+    def execute_batches(self, clear_batches=True, raise_errors=True):
+        n_errors = len(self.errors)
+        execution = self._run_batches(self.batches)
         for batchnum, batch in enumerate(self.batches):
             for reqix, (meta, response) in batch._responses.items():
                 response = response.decode('utf-8')
@@ -346,14 +845,20 @@ class DriveBot:
                         'batchnum': batchnum
                     }
                     self.errors.append(err_rec)
-        if len(self.errors) > 0 and raise_errors is True:
+        if len(self.errors) > n_errors and raise_errors is True:
             raise ExecutionError("some requests failed. check self.errors.")
         if clear_batches:
             self.batches = []
         return execution
 
     def name_to_id(self, name):
-        return first(keyfilter(lambda k: k == name, self.filesystem).values())
+        if len(self.filesystem) == 0:
+            raise ValueError(
+                "A filesystem must be initialized for this DriveBot before "
+                "executing methods using file paths rather than raw file ids."
+                "Try DriveBot.set_filesystem()."
+            )
+        return self.filesystem[name]
 
     def _pick_id(self, name=None, file_id=None):
         name, file_id = self._pick_name_id(name, file_id)
@@ -361,17 +866,12 @@ class DriveBot:
             file_id = self.name_to_id(name)
         return file_id
 
-    def _pick_name_id(self, name=None, file_id=None):
+    @staticmethod
+    def _pick_name_id(name=None, file_id=None):
         if (name is None) and (file_id is None):
             raise ValueError("Must provide either file_id or a new file name.")
         if (name is not None) and (file_id is not None):
             raise ValueError("Will not both update and create a new file.")
-        if file_id is None and self.filesystem is None:
-            raise ValueError(
-                "A filesystem must be initialized for this DriveBot before "
-                "executing methods using file paths rather than raw file ids."
-                "Try DriveBot.set_filesystem()."
-            )
         return name, file_id
 
 
@@ -385,17 +885,14 @@ class DriveScanner(Iterator):
         drivebot: DriveBot,
         query: str = "trashed=false",
         fields: Sequence[str] = (
-            "kind",
             "id",
             "name",
             "mimeType",
             "parents",
-            "size",
-            "owners",
             "modifiedTime",
-            "md5Checksum",
         ),
         page_size: int = 1000,
+        checkpoint_path: Optional[Union[str, Path]] = None,
     ):
         if drivebot.shared_drive_id is not None:
             self.extra_parameters = {
@@ -408,7 +905,8 @@ class DriveScanner(Iterator):
         else:
             self.extra_parameters = {}
         self.drivebot = drivebot
-        self.results = []
+        self.pages: list[list[dict]] = []
+        self.n_files = 0
         self.page_token = None
         self.page_counter = 0
         self.page_size = page_size
@@ -419,34 +917,126 @@ class DriveScanner(Iterator):
         self.complete = False
         self.directories = None
         self.files = None
+        self.multi_parent_ids: list[str] = []
         self.trees = {}
+        self.checkpoint_path = None
+        if checkpoint_path is not None:
+            self.checkpoint_path = Path(checkpoint_path)
+            if self.checkpoint_path.exists():
+                self.load_checkpoint()
+            else:
+                self._write_checkpoint(self._checkpoint_header())
+
+    def _checkpoint_header(self) -> dict:
+        return {"query": self.query, "fields": list(self.fields)}
+
+    def _write_checkpoint(self, record: dict):
+        with self.checkpoint_path.open("a") as stream:
+            stream.write(json.dumps(record) + "\n")
+
+    def load_checkpoint(self):
+        """
+        resume a scan from pages previously written to self.checkpoint_path.
+        a partially-written final line (e.g. from a crash mid-write) is
+        discarded. refuses to resume a checkpoint made with a different
+        query or fields.
+        """
+        with self.checkpoint_path.open("rb") as stream:
+            lines = stream.readlines()
+        if len(lines) > 0 and not lines[-1].endswith(b"\n"):
+            lines = lines[:-1]
+            with self.checkpoint_path.open("r+b") as stream:
+                stream.truncate(sum(map(len, lines)))
+        if len(lines) == 0:
+            self._write_checkpoint(self._checkpoint_header())
+            return
+        if (header := json.loads(lines[0])) != self._checkpoint_header():
+            raise ValueError(
+                f"{self.checkpoint_path} was written for a different scan "
+                f"({header}); will not resume from it."
+            )
+        for line in lines[1:]:
+            page = json.loads(line)
+            self._hold_page(page["files"])
+            self.page_token = page["nextPageToken"]
+            self.page_counter += 1
+        if self.page_counter > 0:
+            self.is_queried = True
+            self.complete = self.page_token is None
 
     def get(self, verbose: bool = False):
         if verbose is True:
             print("fetching...", end="")
-        while self.complete is False:
-            if verbose is True:
-                print(".", end="")
-            next(self)
+        # each response carries the token for the next page, so request the
+        # next page in the background while this one is being recorded
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pending = None
+            if self.complete is False:
+                pending = pool.submit(self._fetch_page, self.compose_request())
+            while pending is not None:
+                if verbose is True:
+                    print(".", end="")
+                response = pending.result()
+                self.page_token, pending = response.get("nextPageToken"), None
+                if self.page_token is not None:
+                    pending = pool.submit(
+                        self._fetch_page, self.compose_request()
+                    )
+                self.ingest(response)
         return self.results
 
+    def iter_files(self) -> Iterator[dict]:
+        """
+        yield files one at a time, fetching further pages only as needed.
+        """
+        for page in tuple(self.pages):
+            yield from page
+        while self.complete is False:
+            yield from next(self)
+
+    @property
+    def results(self) -> list[dict]:
+        return list(chain.from_iterable(self.pages))
+
+    def _hold_page(self, files: list[dict]):
+        self.pages.append(files)
+        self.n_files += len(files)
+
+    @property
+    def fields(self) -> tuple[str, ...]:
+        return self._fields
+
+    @fields.setter
+    def fields(self, fields: Sequence[str]):
+        # the request's fields string is the same on every page, so build it
+        # here rather than in compose_request
+        self._fields = tuple(fields)
+        self._fields_str = f"nextPageToken, files({','.join(self._fields)})"
+
     def compose_request(self) -> dict[str]:
         return {
             "q": self.query,
-            "fields": f"nextPageToken, files({','.join(self.fields)})",
+            "fields": self._fields_str,
             "pageToken": self.page_token,
+            "pageSize": self.page_size,
+            "orderBy": "name",
             **self.extra_parameters,
         }
 
     def make_manifest(self) -> tuple[pd.DataFrame, pd.DataFrame]:
-        if len(self.results) == 0:
+        if self.n_files == 0:
             return (
                 pd.DataFrame(columns=self.fields),
                 pd.DataFrame(columns=self.fields)
             )
-        manifest = pd.DataFrame.from_records(self.results)
+        manifest = file_frame(chain.from_iterable(self.pages))
+        manifest = manifest.dropna(subset=["parents"])
+        # trees are keyed by id, so an item can only appear in one place.
+        # keep the first parent, and note which items lose the others.
+        multi_parent = manifest["parents"].str.len() > 1
+        self.multi_parent_ids = manifest.loc[multi_parent, "id"].tolist()
+        manifest["parents"] = manifest["parents"].str[0]
         manifest = manifest.dropna(subset=["parents"])
-        manifest["parents"] = manifest["parents"].str.join("")
         self.directories, self.files = split_on(
             manifest,
             manifest["mimeType"] == "application/vnd.google-apps.folder",
@@ -456,6 +1046,12 @@ class DriveScanner(Iterator):
     def get_file_trees(self):
         if (self.directories is None) and (self.files is None):
             self.make_manifest()
+        if len(self.multi_parent_ids) > 0:
+            print(
+                f"warning: placing {len(self.multi_parent_ids)} items with "
+                "several parents under their first parent only (e.g. "
+                f"{', '.join(self.multi_parent_ids[:5])})"
+            )
         adjacencies = make_drive_adjacency_list(self.directories)
         segments = segment_trees(adjacencies)
         self.trees = add_files_to_segmented_trees(segments, self.files)
@@ -464,8 +1060,8 @@ class DriveScanner(Iterator):
     def extract_filesystem(self, root_id=None):
         if self.complete is False:
             self.get()
-        if len(self.results) == 0:
-            return {}, [], root_id
+        if self.n_files == 0:
+            return {}, {}, root_id
         if len(self.trees) == 0:
             self.get_file_trees()
         if root_id is None:
@@ -476,15 +1072,27 @@ class DriveScanner(Iterator):
     def __next__(self):
         if self.complete:
             raise StopIteration
+        return self.ingest(self._fetch_page(self.compose_request()))
+
+    def _fetch_page(self, request: dict[str]):
+        return self.drivebot.files().list(**request).execute()
+
+    def ingest(self, response):
+        """
+        record a page of results. split out from __next__ so that pages
+        fetched elsewhere (e.g. in a batch) can be fed to the scanner.
+        """
         self.is_queried = True
-        self.response = (
-            self.drivebot.files().list(**self.compose_request()).execute()
-        )
+        self.response = response
         self.page_token = self.response.get("nextPageToken")
         if self.page_token is None:
             self.complete = True
-        files = self.response.get("files", {})
-        self.results += files
+        files = self.response.get("files", [])
+        self._hold_page(files)
+        if self.checkpoint_path is not None:
+            self._write_checkpoint(
+                {"nextPageToken": self.page_token, "files": files}
+            )
         self.page_counter += 1
         return files
 
@@ -493,7 +1101,7 @@ class DriveScanner(Iterator):
         if self.is_queried is False:
             description += "not yet queried"
         else:
-            description += f"{len(self.results)} retrieved files, "
+            description += f"{self.n_files} retrieved files, "
         if self.complete is True:
             description += "retrieval complete"
         elif self.is_queried is True:
@@ -504,5 +1112,28 @@ class DriveScanner(Iterator):
         return self.__repr__()
 
 
-def ls_fs_dict(folder_name, fs_dict):
-    return keyfilter(lambda fn: str(Path(fn).parent) == folder_name, fs_dict)
+def file_frame(files: Iterable[dict]) -> pd.DataFrame:
+    """
+    make a DataFrame from Drive file records. mimeType is stored as a
+    categorical; every other field keeps the type the API returned.
+    """
+    frame = pd.DataFrame.from_records(list(files))
+    if "mimeType" in frame.columns:
+        frame["mimeType"] = frame["mimeType"].astype("category")
+    return frame
+
+
+def index_fs_dict(fs_dict):
+    """
+    make an index of the form {parent path: {path: id}} from a filesystem
+    dict. top-level paths are indexed under ".".
+    """
+    fs_index = {}
+    for path, drive_id in fs_dict.items():
+        parent = path.rpartition("/")[0] or "."
+        fs_index.setdefault(parent, {})[path] = drive_id
+    return fs_index
+
+
+def ls_fs_dict(folder_name, fs_index):
+    return dict(fs_index.get(folder_name, {}))
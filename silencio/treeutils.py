@@ -1,23 +1,23 @@
-from collections import defaultdict
-from functools import partial
-from random import choice
+from collections import defaultdict, deque
 from typing import Any, Mapping
 
-from cytoolz import keyfilter, valfilter
 import pandas as pd
 
 
 def make_drive_adjacency_list(directories: pd.DataFrame):
-    adjacencies = {}
-    for _, directory in directories.iterrows():
-        siblings = directories.loc[directories["parents"] == directory["id"]]
-        adjacencies[directory["id"]] = {
-            "name": directory["name"],
-            "children": set(siblings["id"].tolist()),
-            "parent": directory["parents"],
-            "id": directory["id"],
+    ids = directories["id"].to_numpy()
+    names = dict(zip(ids, directories["name"].to_numpy()))
+    parents = dict(zip(ids, directories["parents"].to_numpy()))
+    children = directories.groupby("parents")["id"].agg(set).to_dict()
+    return {
+        drive_id: {
+            "name": names[drive_id],
+            "children": children.get(drive_id, set()),
+            "parent": parents[drive_id],
+            "id": drive_id,
         }
-    return adjacencies
+        for drive_id in names
+    }
 
 
 # TODO, maybe: replace this stuff with graphlib
@@ -27,36 +27,41 @@ def find_root(adjacencies: Mapping, node_id: Any):
     return node_id
 
 
+def is_descendant(adjacencies: Mapping, node_id: Any, ancestor_id: Any):
+    while node_id != ancestor_id:
+        if node_id not in adjacencies.keys():
+            return False
+        node_id = adjacencies[node_id]["parent"]
+    return True
+
+
 def paths_from_root(adjacencies: Mapping, root_id: Any):
-    top_nodes = valfilter(lambda x: x["parent"] == root_id, adjacencies)
-    tree = {}
-    unfinished = list(top_nodes.items())
+    unfinished = deque(
+        (node_id, "")
+        for node_id, node in adjacencies.items()
+        if node["parent"] == root_id
+    )
+    tree, seen = {}, set()
     while len(unfinished) > 0:
-        node_id, node = unfinished.pop()
-        path = f"{node.get('path', '')}{node['name']}"
-        if path in tree.values():
+        node_id, prefix = unfinished.popleft()
+        path = f"{prefix}{adjacencies[node_id]['name']}"
+        if path in seen:
             print(f"warning: name collision on {path} under {root_id}")
+        seen.add(path)
         tree[node_id] = path
-        children = {
-            node_id: node | {"path": path + "/"}
-            for node_id, node in keyfilter(
-                lambda x: x in node["children"], adjacencies
-            ).items()
-        }
-        unfinished += list(children.items())
+        unfinished.extend(
+            (child, f"{path}/") for child in adjacencies[node_id]["children"]
+        )
     return tree
 
 
 def segment_trees(adjacencies: Mapping):
-    unrooted_nodes = list(adjacencies.keys())
+    unrooted_nodes = set(adjacencies.keys())
     segments = {}
-    cycles = 0
     while len(unrooted_nodes) > 0:
-        root = find_root(adjacencies, choice(unrooted_nodes))
+        root = find_root(adjacencies, next(iter(unrooted_nodes)))
         tree = paths_from_root(adjacencies, root)
-        unrooted_nodes = [
-            node for node in unrooted_nodes if node not in tree.keys()
-        ]
+        unrooted_nodes -= tree.keys()
         segments[root] = tree
     return segments
 
@@ -68,13 +73,6 @@ def get_segment_ids(segments):
     }
 
 
-def pick_disjoint_set(entry, value_set_mapping):
-    for characteristic, value_set in value_set_mapping.items():
-        if entry in value_set:
-            return characteristic
-    return None
-
-
 def add_files_to_directory_tree(tree, files, root):
     for parent_id, contents in files.groupby("parents"):
         if parent_id == root:
@@ -83,17 +81,20 @@ def add_files_to_directory_tree(tree, files, root):
             continue
         else:
             parent_path = f"{tree[parent_id]}/"
-        for _, row in contents.iterrows():
-            path = f"{parent_path}{row['name']}"
-            tree[row["id"]] = path
+        for drive_id, name in zip(
+            contents["id"].to_numpy(), contents["name"].to_numpy()
+        ):
+            tree[drive_id] = f"{parent_path}{name}"
     return tree
 
 
 def add_files_to_segmented_trees(segments, files):
-    segmenter = partial(
-        pick_disjoint_set, value_set_mapping=get_segment_ids(segments)
-    )
-    segment_membership = files["parents"].map(segmenter)
+    segment_lookup = {
+        node_id: root
+        for root, node_ids in get_segment_ids(segments).items()
+        for node_id in node_ids
+    }
+    segment_membership = files["parents"].map(segment_lookup)
     for root, tree_files in files.groupby(segment_membership):
         add_files_to_directory_tree(segments[root], tree_files, root)
     return segments
@@ -102,9 +103,8 @@ def add_files_to_segmented_trees(segments, files):
 def flip_path_tree(tree):
     paths = {}
     collisions = defaultdict(set)
-    for drive_id in tree.keys():
-        path = tree[drive_id]
-        if path in paths.keys():
+    for drive_id, path in tree.items():
+        if path in paths:
             collisions[path].update({drive_id, paths[path]})
         paths[path] = drive_id
     return (